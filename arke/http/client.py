@@ -5,15 +5,17 @@ from __future__ import annotations
 import abc
 import asyncio
 import logging
+import random
 import typing as t
 
 import aiohttp
 
 from ..__about__ import __version__
-from ..internal.json import JSONable, load_json
+from ..internal.json import JSONable, dump_json, load_json
+from ..internal.lru import LRUCache
 from .auth import Auth
 from .errors import Forbidden, HTTPException, NotFound, ServerError, Unauthorized
-from .ratelimit import Bucket, Lock
+from .ratelimit import _H_GLOBAL, Bucket, Lock
 from .route import Route
 
 __all__ = (
@@ -29,6 +31,10 @@ BASE_API_URL = "https://discord.com/api/v{0}"
 # the url is always the same, so we do not do that here
 BASE_GATEWAY_URL = "wss://gateway.discord.gg"
 API_VERSION = 10
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_CAP = 30.0
+# the most buckets we will remember, the least recently used ones are dropped after this
+MAX_BUCKETS = 4096
 
 
 def _get_user_agent():
@@ -39,6 +45,11 @@ def _get_base_url():
     return BASE_API_URL.format(API_VERSION)
 
 
+def _bucket_is_evictable(_: tuple[t.Optional[str], str], bucket: Bucket):
+    # dropping a locked bucket would let the next request through it straight into a 429
+    return not bucket.locked
+
+
 class BasicHTTPClient(abc.ABC):
     async def request(
         self,
@@ -55,18 +66,22 @@ class BasicHTTPClient(abc.ABC):
 class HTTPClient(BasicHTTPClient):
     def __init__(self, default_auth: Auth, *, bucket_lag: float = 0.2):
         self._http: t.Optional[aiohttp.ClientSession] = None
-        self._default_headers: dict[str, str] = {
-            "User-Agent": _get_user_agent(),
-            "Authorization": default_auth.header,
-        }
+        # only headers that are safe to send everywhere, including the gateway, go on the session
+        self._session_headers: dict[str, str] = {"User-Agent": _get_user_agent()}
+        self._default_auth: Auth = default_auth
+        self._default_timeout = aiohttp.ClientTimeout(total=60, connect=10)
         self._base_url = _get_base_url()
         self._default_bucket_lag = bucket_lag
-        self._local_to_discord: dict[str, str] = {}
-        self._buckets: dict[str, Bucket] = {}
+        self._local_to_discord: LRUCache[str, str] = LRUCache(
+            MAX_BUCKETS, evictable=self._discord_hash_is_evictable
+        )
+        self._buckets: LRUCache[tuple[t.Optional[str], str], Bucket] = LRUCache(
+            MAX_BUCKETS, evictable=_bucket_is_evictable
+        )
         self._global_lock: Lock = Lock()
-        self._global_lock.set()
 
     async def __aenter__(self):
+        await self.connect()
         return self
 
     async def __aexit__(self, *_):
@@ -74,26 +89,56 @@ class HTTPClient(BasicHTTPClient):
 
     @property
     def http(self):
-        if self._http is None:
-            self._http = aiohttp.ClientSession()
+        assert (
+            self._http is not None
+        ), "We have not connected yet! Please connect via the connect method."
 
         return self._http
 
+    async def connect(self):
+        if self._http is not None:
+            return
+
+        # discord is the only host we talk to, so most of the pool can be reused for it
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=50,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+            enable_cleanup_closed=True,
+        )
+        self._http = aiohttp.ClientSession(
+            headers=self._session_headers,
+            connector=connector,
+            timeout=self._default_timeout,
+            json_serialize=dump_json,
+        )
+
     async def close(self):
         if self._http is None:
             return
 
         await self._http.close()
+        self._http = None
+
+    def _discord_hash_is_evictable(self, local_bucket: str, discord_hash: str):
+        # forgetting the hash of a locked bucket would send its route to a fresh, unlocked bucket
+        bucket = self._buckets.peek((discord_hash, local_bucket))
+        return bucket is None or not bucket.locked
 
     @t.overload
-    def _get_bucket(self, key: str, *, autocreate: t.Literal[True] = True) -> Bucket:
+    def _get_bucket(
+        self, key: tuple[t.Optional[str], str], *, autocreate: t.Literal[True] = True
+    ) -> Bucket:
         pass
 
     @t.overload
-    def _get_bucket(self, key: str, *, autocreate: t.Literal[False]) -> t.Optional[Bucket]:
+    def _get_bucket(
+        self, key: tuple[t.Optional[str], str], *, autocreate: t.Literal[False]
+    ) -> t.Optional[Bucket]:
         pass
 
-    def _get_bucket(self, key: str, *, autocreate: bool = True):
+    def _get_bucket(self, key: tuple[t.Optional[str], str], *, autocreate: bool = True):
         bucket = self._buckets.get(key)
 
         if not bucket and autocreate:
@@ -102,6 +147,15 @@ class HTTPClient(BasicHTTPClient):
 
         return bucket
 
+    async def _wait_for_ratelimits(self, bucket: Bucket):
+        bucket.auto_lock()
+        loop = asyncio.get_running_loop()
+
+        # sleep once until both the global lock and the bucket are free instead of waking up for
+        # each of them, a lock may have been extended while we slept so the deadline is rechecked
+        while (delay := max(self._global_lock.locked_until, bucket.locked_until) - loop.time()) > 0:
+            await asyncio.sleep(delay)
+
     async def request(
         self,
         route: Route,
@@ -117,13 +171,9 @@ class HTTPClient(BasicHTTPClient):
         if headers and "Authorization" in headers:
             raise ValueError("Use the auth parameter to set authentication for this request.")
 
-        if not headers:
-            headers = {}
-
-        headers = {**self._default_headers, **headers}
-
-        if auth:
-            headers["Authorization"] = auth.header
+        # the user agent is already set on the session
+        headers = {**headers} if headers else {}
+        headers["Authorization"] = (auth or self._default_auth).header
 
         params: dict[str, t.Any] = {"headers": headers}
 
@@ -136,109 +186,131 @@ class HTTPClient(BasicHTTPClient):
         local_bucket = route.bucket
         discord_hash = self._local_to_discord.get(local_bucket)
 
-        key = local_bucket
-        if discord_hash:
-            key = f"{discord_hash}:{local_bucket}"
+        key = (discord_hash, local_bucket)
 
         bucket = self._get_bucket(key)
 
         MAX_RETRIES = 5
 
+        method = route.method
+        url = self._base_url + route.formatted_url
+
         _log.debug("Request with bucket %s will start.", key)
         for try_ in range(MAX_RETRIES):
-            async with self._global_lock:
-                _log.debug("The global lock has been acquired.")
-                async with bucket:
-                    _log.debug("The local bucket has been acquired.")
-                    async with self.http.request(
-                        route.method, self._base_url + route.formatted_url, **params
-                    ) as resp:
-                        bucket.update_from(resp)
-
-                        if bucket.enabled:
-                            if discord_hash != bucket.bucket:
-                                discord_hash = bucket.bucket
-                                key = f"{discord_hash}:{local_bucket}"
-                                self._local_to_discord[local_bucket] = discord_hash
-
-                                _log.debug(
-                                    "Our bucket has migrated to %s! The new bucket will be refetched.",
-                                    key,
-                                )
-
-                                if new_bucket := self._get_bucket(key, autocreate=False):
-                                    bucket = new_bucket
-                                else:
-                                    self._buckets[key] = bucket
-
-                            await bucket.acquire()
-
-                        if 300 > resp.status >= 200:
-                            _log.debug(
-                                "Successfully made a request to %s with status code %i and in %i "
-                                + ("try" if try_ == 1 else "tries")
-                                + ".",
-                                route.formatted_url,
-                                resp.status,
-                                try_ + 1,
-                            )
-
-                            if resp.status == 204:
-                                return
-
-                            content = await resp.text()
-                            return json_or_text(content, resp.content_type)
-
-                        if resp.status == 429:
-                            is_global = bool(resp.headers.get("X-RateLimit-Global", False))
-                            retry_after = float(resp.headers["Retry-After"])
-
-                            if is_global:
-                                _log.info(
-                                    "We have hit a global ratelimit! We will globally lock for %f seconds.",
-                                    retry_after,
-                                )
-
-                                self._global_lock.lock_for(retry_after)
-                                await self._global_lock.wait()
-                            else:
-                                _log.info(
-                                    "Bucket %s has hit a ratelimit! We will lock for %f seconds.",
-                                    key,
-                                    retry_after,
-                                )
-
-                                bucket.lock_for(retry_after)
-                                await bucket.acquire(auto_lock=False)
-
-                            continue
-
-                        if 500 > resp.status >= 400:
-                            raw_content = await resp.text()
-                            content = json_or_text(raw_content, resp.content_type)
-
-                            if t.TYPE_CHECKING:
-                                content = t.cast(t.Mapping[str, t.Any], content)
-
-                            if resp.status == 401:
-                                raise Unauthorized(content)
-                            if resp.status == 403:
-                                raise Forbidden(content)
-                            if resp.status == 404:
-                                raise NotFound(content)
-
-                            raise HTTPException(content, resp.status, resp.reason)
-
-                        if 600 > resp.status >= 500:
-                            if resp.status in (500, 502):
-                                _log.info(
-                                    "We have gotten server error %i! We will retry in %i.",
-                                    resp.status,
-                                    2 * try_ + 1,
-                                )
-                                await asyncio.sleep(2 * try_ + 1)
-                                continue
-                            raise ServerError(None, resp.status, resp.reason)
+            await self._wait_for_ratelimits(bucket)
+            _log.debug("The global lock and local bucket have been acquired.")
+
+            content: str | JSONable | None = None
+            error: t.Optional[HTTPException] = None
+            backoff: t.Optional[float] = None
+
+            async with self.http.request(method, url, **params) as resp:
+                bucket.update_from(resp)
+
+                if bucket.enabled:
+                    if discord_hash != bucket.bucket:
+                        # requests for this route will only look up the new key from now on
+                        self._buckets.pop(key, None)
+
+                        discord_hash = bucket.bucket
+                        key = (discord_hash, local_bucket)
+                        self._local_to_discord[local_bucket] = discord_hash
+
+                        _log.debug(
+                            "Our bucket has migrated to %s! The new bucket will be refetched.",
+                            key,
+                        )
+
+                        if new_bucket := self._get_bucket(key, autocreate=False):
+                            bucket = new_bucket
+                        else:
+                            self._buckets[key] = bucket
+
+                status = resp.status
+                status_class = status // 100
+
+                if status_class == 2:
+                    _log.debug(
+                        "Successfully made a request to %s with status code %i and in %i "
+                        + ("try" if try_ == 1 else "tries")
+                        + ".",
+                        route.formatted_url,
+                        status,
+                        try_ + 1,
+                    )
+
+                    content = await _read_body(resp)
+
+                elif status == 429:
+                    is_global = resp.headers.get(_H_GLOBAL) == "true"
+                    retry_after = float(resp.headers["Retry-After"])
+
+                    if is_global:
+                        _log.info(
+                            "We have hit a global ratelimit! We will globally lock for %f seconds.",
+                            retry_after,
+                        )
+
+                        self._global_lock.lock_for(retry_after)
+                    else:
+                        _log.info(
+                            "Bucket %s has hit a ratelimit! We will lock for %f seconds.",
+                            key,
+                            retry_after,
+                        )
+
+                        bucket.lock_for(retry_after)
+
+                    # the next try waits for the lock
+                    continue
+
+                elif status_class == 4:
+                    content = await _read_body(resp)
+
+                    if t.TYPE_CHECKING:
+                        content = t.cast(t.Mapping[str, t.Any], content)
+
+                    if status == 401:
+                        error = Unauthorized(content)
+                    elif status == 403:
+                        error = Forbidden(content)
+                    elif status == 404:
+                        error = NotFound(content)
+                    else:
+                        error = HTTPException(content, status, resp.reason)
+
+                elif status_class == 5:
+                    if status in (500, 502, 503, 504):
+                        # exponential backoff with full jitter, so clients don't retry in lockstep
+                        backoff = random.uniform(
+                            0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2**try_)
+                        )
+                    else:
+                        error = ServerError(None, status, resp.reason)
+
+                else:
+                    continue
+
+            # sleep after the response is released, so its connection goes back to the pool
+            if backoff is not None:
+                if try_ < MAX_RETRIES - 1:
+                    _log.info(
+                        "We have gotten server error %i! We will retry in %f seconds.",
+                        status,
+                        backoff,
+                    )
+                    await asyncio.sleep(backoff)
+
+                continue
+
+            # the body has been read by now, so waiting on the bucket cannot time out the response
+            if bucket.enabled:
+                await bucket.acquire()
+
+            if error is not None:
+                raise error
+
+            return content
 
         _log.error(
             "Tried to make request to %s with method %s %d times.",
@@ -283,11 +355,22 @@ class HTTPClient(BasicHTTPClient):
 
 
 def json_or_text(content: str | None, content_type: str) -> str | JSONable | None:
-    content_type = content_type.lower()
+    # aiohttp lowercases ClientResponse.content_type for us
+    if not content or not content_type:
+        return None
+
+    if content_type.startswith("application/json"):
+        return load_json(content)
+
+    return content
+
+
+async def _read_body(resp: aiohttp.ClientResponse) -> str | JSONable | None:
+    if resp.status == 204:
+        return None
 
-    if content and content_type != "":
-        if content_type == "application/json":
-            return load_json(content)
-        return content
+    if resp.content_type == "application/json":
+        # the content type was checked above, so aiohttp does not need to check it again
+        return await resp.json(loads=load_json, content_type=None)
 
-    return None
+    return json_or_text(await resp.text(), resp.content_type)
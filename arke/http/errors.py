@@ -13,14 +13,20 @@ __all__ = (
 
 def _flatten_error_dict(d: dict[str, t.Any], *, parent: str = ""):
     ret: dict[str, t.Any] = {}
-
-    for k, v in d.items():
-        full_key = f"{parent}/{k}"
-
-        if isinstance(v, list) and k == "_errors":
-            ret[parent] = "\n".join([v2["message"] for v2 in v])
-        elif isinstance(v, dict):
-            ret.update(_flatten_error_dict(v, parent=full_key))
+    # a stack of iterators keeps the depth-first order without recursing
+    stack: list[tuple[str, t.Iterator[tuple[str, t.Any]]]] = [(parent, iter(d.items()))]
+
+    while stack:
+        current_parent, items = stack[-1]
+
+        for k, v in items:
+            if isinstance(v, list) and k == "_errors":
+                ret[current_parent] = "\n".join(v2["message"] for v2 in v)
+            elif isinstance(v, dict):
+                stack.append((f"{current_parent}/{k}", iter(v.items())))
+                break
+        else:
+            stack.pop()
 
     return ret
 
@@ -1,10 +1,11 @@
 # SPDX-License-Identifier: MIT
 
-import datetime
+import asyncio
 import logging
 import typing as t
 
 import aiohttp
+from multidict import istr
 
 from ..internal.ratelimit import Lock
 
@@ -15,18 +16,37 @@ __all__ = (
 
 _log = logging.getLogger(__name__)
 
+# istr keys skip the case-folding CIMultiDict would otherwise do on every lookup
+_H_BUCKET = istr("X-RateLimit-Bucket")
+_H_GLOBAL = istr("X-RateLimit-Global")
+_H_LIMIT = istr("X-RateLimit-Limit")
+_H_REMAINING = istr("X-RateLimit-Remaining")
+_H_RESET = istr("X-RateLimit-Reset")
+_H_RESET_AFTER = istr("X-RateLimit-Reset-After")
+
 
 class Bucket:
+    __slots__ = (
+        "lag",
+        "bucket",
+        "reset_after",
+        "_locked_until",
+        "limit",
+        "remaining",
+        "reset",
+        "enabled",
+    )
+
     def __init__(self, lag: float = 0.2):
         self.lag: float = lag
 
         self.bucket: str = ""
         self.reset_after: float = 0.0
-        self._lock: Lock = Lock()
+        # the loop time at which this bucket unlocks, most requests only have to compare against it
+        self._locked_until: float = 0.0
         self.limit: int = 1
         self.remaining: int = 1
-        self.reset: t.Optional[datetime.datetime] = None
-        self.bucket: str = ""
+        self.reset: float = 0.0
         self.enabled: bool = True
 
     async def __aenter__(self):
@@ -42,7 +62,7 @@ class Bucket:
             _log.debug("This bucket will skip an update because it's not enabled.")
             return
 
-        x_bucket: t.Optional[str] = headers.get("X-RateLimit-Bucket")
+        x_bucket: t.Optional[str] = headers.get(_H_BUCKET)
         if x_bucket is None:
             _log.debug("Ratelimiting is not supported for this bucket.")
             self.enabled = False
@@ -53,43 +73,54 @@ class Bucket:
 
         # from here on, the route has ratelimits
 
-        if headers.get("X-RateLimit-Global", False):
+        # the header is a string, so "false" would be truthy
+        if headers.get(_H_GLOBAL) == "true":
             _log.debug("This ratelimit is globally applied.")
             return
 
-        x_limit: int = int(headers["X-RateLimit-Limit"])
-        if x_limit != self.limit:
-            self.limit = x_limit
+        self.limit = int(headers[_H_LIMIT])
 
-        x_remaining: int = int(headers.get("X-RateLimit-Remaining", 1))
+        x_remaining: int = int(headers.get(_H_REMAINING, 1))
         if x_remaining < self.remaining or self.remaining == 0:
             self.remaining = x_remaining
 
-        # TODO: consider removing this
-        x_reset: datetime.datetime = datetime.datetime.fromtimestamp(
-            float(headers["X-RateLimit-Reset"])
-        )
-        if x_reset != self.reset:
-            self.reset = x_reset
+        # kept as the raw epoch timestamp, building a datetime for every response is wasteful
+        self.reset = float(headers[_H_RESET])
 
-        x_reset_after: float = float(headers["X-RateLimit-Reset-After"])
+        x_reset_after: float = float(headers[_H_RESET_AFTER])
         if x_reset_after > self.reset_after:
             self.reset_after = x_reset_after
             self.reset_after += self.lag
 
+    @property
+    def locked_until(self) -> float:
+        return self._locked_until
+
+    @property
+    def locked(self) -> bool:
+        return asyncio.get_running_loop().time() < self._locked_until
+
     def lock_for(self, time: float):
-        if not self._lock.is_set():
+        now = asyncio.get_running_loop().time()
+        if now < self._locked_until:
             return
 
         _log.debug("Bucket %s will be locked for %f seconds.", self.bucket, time)
-        self._lock.lock_for(time)
+        self._locked_until = now + time
 
-    async def acquire(self, *, auto_lock: bool = True):
-        if self.remaining == 0 and auto_lock:
+    def auto_lock(self):
+        if self.remaining == 0:
             _log.debug("Bucket %s will be auto-locked.", self.bucket)
             self.lock_for(self.reset_after)
             # prevent the bucket from being locked again until after we actually make a request
             self.remaining = 1
 
-        await self._lock.wait()
+    async def acquire(self, *, auto_lock: bool = True):
+        if auto_lock:
+            self.auto_lock()
+
+        loop = asyncio.get_running_loop()
+        while (delay := self._locked_until - loop.time()) > 0:
+            await asyncio.sleep(delay)
+
         _log.debug("Bucket %s has been acquired!", self.bucket)
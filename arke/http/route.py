@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import sys
 import typing as t
 import urllib.parse as urlparse
 
@@ -35,4 +36,5 @@ class Route:
         for k, v in top_level_params.items():
             formatted_url = formatted_url.replace(f"{{{k}}}", v)
 
-        return formatted_url
+        # interned so bucket keys built from it hash and compare cheaply
+        return sys.intern(formatted_url)
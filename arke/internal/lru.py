@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: MIT
+
+import collections
+import typing as t
+
+__all__ = ("LRUCache",)
+
+_KT = t.TypeVar("_KT")
+_VT = t.TypeVar("_VT")
+_T = t.TypeVar("_T")
+
+
+class LRUCache(collections.OrderedDict[_KT, _VT]):
+    def __init__(
+        self,
+        maxsize: int = 128,
+        *,
+        evictable: t.Optional[t.Callable[[_KT, _VT], bool]] = None,
+    ):
+        super().__init__()
+        self.maxsize: int = maxsize
+        # entries this returns False for are kept, even if that puts us over maxsize for a while
+        self.evictable: t.Optional[t.Callable[[_KT, _VT], bool]] = evictable
+
+    def __getitem__(self, key: _KT) -> _VT:
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: _KT, value: _VT):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+
+        if len(self) > self.maxsize:
+            self._evict(len(self) - self.maxsize)
+
+    def __reduce__(self):
+        return (
+            self.__class__,
+            (self.maxsize,),
+            {"evictable": self.evictable},
+            None,
+            iter(collections.OrderedDict.items(self)),
+        )
+
+    def copy(self):
+        new = self.__class__(self.maxsize, evictable=self.evictable)
+        new.update(collections.OrderedDict.items(self))
+        return new
+
+    def _evict(self, count: int):
+        keys: list[_KT] = []
+
+        # the oldest entries come first
+        for key, value in collections.OrderedDict.items(self):
+            if len(keys) == count:
+                break
+
+            if self.evictable is None or self.evictable(key, value):
+                keys.append(key)
+
+        for key in keys:
+            del self[key]
+
+    def peek(self, key: _KT, default: t.Optional[_T] = None) -> _VT | _T | None:
+        # looks up a key without marking it as recently used
+        return collections.OrderedDict.get(self, key, default)
+
+    @t.overload
+    def get(self, key: _KT, default: None = None) -> t.Optional[_VT]:
+        pass
+
+    @t.overload
+    def get(self, key: _KT, default: _VT | _T) -> _VT | _T:
+        pass
+
+    def get(self, key: _KT, default: t.Any = None) -> t.Any:
+        # OrderedDict.get does not go through __getitem__
+        if key not in self:
+            return default
+
+        return self[key]
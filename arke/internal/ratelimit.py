@@ -9,10 +9,12 @@ __all__ = ("Lock", "TimePer")
 _log = logging.getLogger(__name__)
 
 
-class Lock(asyncio.Event):
+class Lock:
+    __slots__ = ("locked_until",)
+
     def __init__(self):
-        super().__init__()
-        self.set()
+        # the loop time at which this lock unlocks, most waiters only have to compare against it
+        self.locked_until: float = 0.0
 
     async def __aenter__(self):
         await self.wait()
@@ -21,13 +23,18 @@ class Lock(asyncio.Event):
         pass
 
     def lock_for(self, time: float):
-        if not self.is_set():
+        now = asyncio.get_running_loop().time()
+        if now < self.locked_until:
             return
 
+        self.locked_until = now + time
+
+    async def wait(self):
         loop = asyncio.get_running_loop()
 
-        self.clear()
-        loop.call_later(time, self.set)
+        # the lock may have been extended while we slept, so the deadline is rechecked
+        while (delay := self.locked_until - loop.time()) > 0:
+            await asyncio.sleep(delay)
 
 
 class TimePer: